@@ -1,10 +1,13 @@
+import asyncio
 import os
+import re
 import shutil
 import subprocess
+import tempfile
 from typing import Optional
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 from openai import ChatCompletion
@@ -13,9 +16,9 @@ from quill.bot import BaseBot, BotFactory
 from quill.core.config import Config
 from quill.core.pretty import Pretty
 from quill.core.types import BotTypes, LLMTypes, ProjectTypes, ServerTypes
-from quill.core.utils import QUILL_DIR
+from quill.core.utils import QUILL_DIR, MemoryBudget, load_ignore_patterns
 from quill.llm import BaseLLM, LLMFactory
-from quill.project import BaseProject, ProjectFactory
+from quill.project import AssetGraph, BaseProject, ProjectFactory, releases
 from quill.server import BaseServer, ServerFactory
 
 pretty = Pretty()
@@ -50,6 +53,49 @@ class BabyQuill(BaseBot):
         return self.get_llm().generate(*args, **kwargs)
 
 
+SCRIPT_TAG = re.compile(
+    r"(<script\b[^>]*\bsrc\s*=\s*[\"'])([^\"']+)([\"'][^>]*>\s*</script>)", re.IGNORECASE
+)
+"""Script tags loading a file, the URL in the second group."""
+
+LINK_TAG = re.compile(
+    r"(<link\b[^>]*\bhref\s*=\s*[\"'])([^\"']+)([\"'][^>]*>)", re.IGNORECASE
+)
+"""Link tags, the URL in the second group."""
+
+MINIFIERS = {"css-minify": "2.0.0", "html-minifier": "4.0.0", "uglify-js": "3.17.4"}
+"""Minifier versions, pinned so stored build artifacts match what a build would produce."""
+
+GRAPH_FILE = os.path.join(".quill", "asset-graph.json")
+"""Path, relative to a release, of the asset graph its outputs were built from."""
+
+
+BUILDING_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta http-equiv="refresh" content="1"><title>Building...</title></head>
+<body><p>🔮 Building project, this page will refresh when it is ready.</p></body>
+</html>
+"""
+
+
+class SwappableStaticFiles(StaticFiles):
+    """Static files whose directory can be replaced while serving"""
+
+    def swap(self, directory: str):
+        self.directory = directory
+        self.all_directories = [directory]
+        self.config_checked = False
+
+    async def check_config(self):
+        if not os.path.isdir(self.directory):
+            raise HTTPException(
+                status_code=503,
+                detail="Build in progress",
+                headers={"Retry-After": "1"},
+            )
+        await super().check_config()
+
+
 class StaticWebsiteServer(BaseServer):
     """Serves static websites"""
 
@@ -60,10 +106,15 @@ class StaticWebsiteServer(BaseServer):
 
         current_dir = os.getcwd()
         print(current_dir)
-        project_dist = os.path.join(current_dir, "dist")
+        # pin the current build so a later swap doesn't mix two builds in one page
+        self.project_dist = os.path.realpath(os.path.join(current_dir, "dist"))
+        self.project_static = SwappableStaticFiles(
+            directory=os.path.join(self.project_dist, "static"), check_dir=False
+        )
 
         self.mount(app=self.create_app(quill_dist), path="/", name="quill")
-        self.mount(app=self.create_app(project_dist), path=f"/project", name=f"{config.project.name.lower()}")
+        self.mount(app=self.create_project_app(), path=f"/project", name=f"{config.project.name.lower()}")
+        self.enable_admission_control()
 
     def create_app(self, path):
         sub_app = FastAPI()
@@ -77,17 +128,36 @@ class StaticWebsiteServer(BaseServer):
 
         return sub_app
 
+    def create_project_app(self):
+        sub_app = FastAPI()
+        pretty.info(f"Creating app for {self.project_dist}")
+        sub_app.mount("/static", self.project_static, name="static")
+
+        @sub_app.get("/", response_class=HTMLResponse)
+        async def root():
+            index = os.path.join(self.project_dist, "index.html")
+            if not os.path.isfile(index):
+                return HTMLResponse(BUILDING_PAGE, status_code=503, headers={"Retry-After": "1"})
+            with open(index) as f:
+                return f.read()
+
+        return sub_app
+
     def mount(self, app, path, name):
         self.app.mount(path=path, app=app, name=name)
 
-    
+    def swap(self, path: str):
+        """Serves the project from path from now on"""
+        self.project_dist = path
+        self.project_static.swap(os.path.join(path, "static"))
+        pretty.info(f"Serving {path}")
+
     def run(self, port: int = 4455):
         uvicorn.run(self.app, host="localhost", port=port)
 
-
-
-        
-        
+    async def arun(self, port: int = 4455):
+        server = uvicorn.Server(uvicorn.Config(self.app, host="localhost", port=port))
+        await server.serve()
 
 
 class StaticWebsite(BaseProject):
@@ -98,75 +168,232 @@ class StaticWebsite(BaseProject):
         self.name = project_config.name
         self.project_type = ProjectTypes.StaticWebsite.value
         self.project_root = project_config.project_root
-
-    def build(self):
-        project_root = os.getcwd() if self.project_root == "." else self.project_root
-        dist_root = os.path.join(project_root, "dist")
+        self.build_config = config.build
+
+    def build(self, dist_root: Optional[str] = None):
+        if dist_root is None:
+            # never write into the release being served, build a new one and swap it in
+            project_root = self._root()
+            release = releases.new_release(project_root)
+            self.build(dist_root=release)
+            releases.publish(project_root, release)
+            dist_root = os.path.join(project_root, "dist")
+            return (dist_root, os.path.join(dist_root, "static"))
+
+        project_root = self._root()
         static_root = os.path.join(dist_root, "static")
+        # kept with the outputs it describes, a release that is never published can't leave it ahead of dist
+        graph_path = os.path.join(dist_root, GRAPH_FILE)
 
-        if os.path.exists(static_root):
+        previous = AssetGraph.load(project_root, graph_path)
+        if previous is None and os.path.exists(dist_root):
             shutil.rmtree(dist_root)
             pretty.info(f"Deleted {dist_root}")
 
-        os.makedirs(static_root)
-
-        self._minify_files()
+        os.makedirs(static_root, exist_ok=True)
+
+        graph = self._scan(project_root)
+        changed = graph.changed(previous)
+        targets = self._targets(graph)
+        stale = self._targets(previous) if previous else {}
+
+        # outputs whose entry no longer exists
+        for output in set(stale) - set(targets):
+            output_path = os.path.join(dist_root, output)
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+        dirty = {
+            output: inputs
+            for output, inputs in targets.items()
+            if stale.get(output) != inputs
+            or changed.intersection(inputs)
+            or not os.path.exists(os.path.join(dist_root, output))
+        }
+        pretty.info(f"Rebuilding {len(dirty)} of {len(targets)} assets")
+
+        if dirty:
+            self.prepare_build()
+            self._minify_files(project_root, dist_root, dirty, graph)
+        graph.save(graph_path)
 
         return (dist_root, static_root)
 
         # files available at "dist/index.html" and "dist/static/*"
 
-    def _minify_files(self):
-        """Minifies files in the static directory"""
-        dist_root = "dist"
-        static_root = os.path.join(dist_root, "static")
+    def _root(self):
+        return os.getcwd() if self.project_root == "." else self.project_root
 
+    def _scan(self, project_root):
+        patterns = load_ignore_patterns(project_root, extra=self.build_config.ignore)
+        return AssetGraph.scan(project_root, patterns=patterns)
+
+    def targets(self):
+        project_root = self._root()
+        graph = self._scan(project_root)
+        return self._targets(graph)
+
+    def build_targets(self, targets, dist_root):
+        project_root = self._root()
+        self._minify_files(project_root, dist_root, targets, self._scan(project_root))
+
+    def prepare_build(self):
+        """Installs the minifiers"""
         try:
-            # install dependencies
-            dependencies = ["css-minify", "html-minifier", "uglify-js"]
+            dependencies = [self._minifier(name) for name in MINIFIERS]
 
             install_dependencies_cmd = ["npm", "install", *dependencies, "-g"]
             subprocess.run(install_dependencies_cmd, check=True)
 
-            # Minify HTML
-            html_minify_cmd = [
-                "npx",
-                "html-minifier",
-                "--file-ext",
-                "html",
-                "--input-dir",
-                ".",
-                "--output-dir",
-                dist_root,
-                "--collapse-whitespace",
-                "--minify-css",
-                "--minify-js",
-            ]
-            subprocess.run(html_minify_cmd, check=True)
-
-            js_files = filter(lambda x: x.endswith(".js"), os.listdir("."))
-            # Minify JS
-            js_minify_cmd = [
-                "npx",
-                "uglify-js",
-                *js_files,
-                "-c",
-                "-m",
-                "-o",
-                os.path.join(static_root, "index.js"),
-            ]
-            subprocess.run(js_minify_cmd, check=True)
-
-            # Minify CSS
-            css_minify_cmd = [
-                "npx",
-                "css-minify",
-                "-d",
-                ".",
-                "-o",
-                static_root,
-            ]
-            subprocess.run(css_minify_cmd, check=True)
+        except subprocess.CalledProcessError as e:
+            pretty.error(
+                error_type="CalledProcessError",
+                message=f"An error occurred while installing minifiers: {e}",
+                terminate=True,
+            )
+
+    def build_fingerprint(self):
+        return " ".join(self._minifier(name) for name in sorted(MINIFIERS))
+
+    def _minifier(self, name):
+        return f"{name}@{MINIFIERS[name]}"
+
+    def _targets(self, graph: AssetGraph):
+        """Maps every build output, relative to dist, to its ordered inputs
+
+        Inputs hold everything an output is made from, transitively, so an
+        output is rebuilt exactly when one of the assets it depends on changes.
+        """
+        targets = {}
+
+        def add(output, inputs):
+            if output in targets:
+                pretty.error(
+                    error_type="BuildError",
+                    message=f"{inputs[-1]} and {targets[output][-1]} both build {output}.",
+                    terminate=True,
+                )
+            targets[output] = inputs
+
+        unbundled = self._unbundled(graph)
+        standalone = set(graph.entries())
+        for path in graph.hashes:
+            if path.endswith(".html"):
+                # the page is rewritten to point at what its references build to
+                refs = graph.edges.get(path, [])
+                add(path, [*refs, path])
+                # one bundle per page instead of a single index.js
+                bundle = [ref for ref in refs if ref.endswith(".js") and ref not in unbundled]
+                if bundle:
+                    add(self._bundle_output(path), bundle)
+            elif path.endswith(".css"):
+                # imports are rewritten to their builds, so imported changes rebuild too
+                add(self._css_output(path), graph.closure(path, ".css"))
+            elif path in unbundled or path in standalone:
+                add(self._script_output(path), [path])
+
+        return targets
+
+    def _unbundled(self, graph: AssetGraph):
+        """Returns the scripts built on their own rather than into a page bundle
+
+        ES modules and scripts importing others keep their own file, at the
+        same relative path, so their imports keep resolving.
+        """
+        importing = {path for path, refs in graph.edges.items() if path.endswith(".js") and refs}
+        return graph.modules | importing
+
+    def _css_output(self, path):
+        # css-minify writes <name>.min.css into the output directory
+        return os.path.join("static", os.path.splitext(path)[0] + ".min.css")
+
+    def _script_output(self, path):
+        return os.path.join("static", path)
+
+    def _bundle_output(self, page):
+        # suffixed so index.html's bundle doesn't collide with an index.js
+        return os.path.join("static", os.path.splitext(page)[0] + ".page.js")
+
+    def _output_of(self, path):
+        """Returns the output a stylesheet or unbundled script builds to"""
+        return self._css_output(path) if path.endswith(".css") else self._script_output(path)
+
+    def _url(self, output, source):
+        """Returns the relative URL of output as referenced from the source output"""
+        url = os.path.relpath(output, os.path.dirname(source)).replace(os.sep, "/")
+        # module specifiers without ./ would be looked up as packages
+        return url if url.startswith("../") else f"./{url}"
+
+    def _rewrite_page(self, project_root, page, graph: AssetGraph):
+        """Returns the page pointing at the builds of its scripts and styles
+
+        Module tags keep their attributes and load the module's own build.
+        Classic scripts are replaced by the page bundle, loaded by the first
+        one's tag, so they should agree on defer and async.
+        """
+        refs = set(graph.edges.get(page, []))
+        unbundled = self._unbundled(graph)
+        with open(os.path.join(project_root, page), "r") as f:
+            html = f.read()
+
+        bundled = False
+
+        def script(match):
+            nonlocal bundled
+            ref = AssetGraph.resolve(page, match.group(2))
+            if ref not in refs or not ref.endswith(".js"):
+                return match.group(0)
+            if ref in unbundled:
+                return f"{match.group(1)}{self._url(self._script_output(ref), page)}{match.group(3)}"
+            if bundled:
+                return ""
+            bundled = True
+            return f"{match.group(1)}{self._url(self._bundle_output(page), page)}{match.group(3)}"
+
+        def stylesheet(match):
+            ref = AssetGraph.resolve(page, match.group(2))
+            if ref not in refs or not ref.endswith(".css"):
+                return match.group(0)
+            return f"{match.group(1)}{self._url(self._css_output(ref), page)}{match.group(3)}"
+
+        html = SCRIPT_TAG.sub(script, html)
+        return LINK_TAG.sub(stylesheet, html)
+
+    def _rewrite_asset(self, project_root, path, output):
+        """Returns the stylesheet or script at path importing the builds of its imports"""
+        with open(os.path.join(project_root, path), "r") as f:
+            content = f.read()
+        return AssetGraph.rewrite(
+            path, content, lambda ref: self._url(self._output_of(ref), output)
+        )
+
+    def _minify_files(self, project_root, dist_root, targets, graph: AssetGraph):
+        """Minifies the given targets into dist, pages and stylesheets in batches"""
+        pages = [output for output in targets if output.endswith(".html")]
+        styles = [output for output in targets if output.endswith(".css")]
+        scripts = [output for output in targets if output.endswith(".js")]
+        own = self._unbundled(graph) | set(graph.entries())
+        # minifier calls get smaller while the build runs over the memory ceiling
+        budget = MemoryBudget(self.build_config.chunk_size, self.build_config.max_memory_mb)
+
+        try:
+            with tempfile.TemporaryDirectory(prefix="quill-minify-") as staging:
+                for chunk in budget.chunks(pages):
+                    self._minify_pages(project_root, dist_root, staging, chunk, graph, budget)
+                for chunk in budget.chunks(styles):
+                    self._minify_styles(project_root, dist_root, staging, chunk, targets, budget)
+
+                for output in scripts:
+                    output_path = os.path.join(dist_root, output)
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    inputs = targets[output]
+                    if inputs[-1] in own and output == self._script_output(inputs[-1]):
+                        self._minify_script(
+                            project_root, staging, output, inputs[-1], graph, output_path, budget
+                        )
+                    else:
+                        # Minify JS, in parts so large bundles stay under the argv limit
+                        self._minify_bundle(project_root, output_path, inputs, budget)
 
         except subprocess.CalledProcessError as e:
             pretty.error(
@@ -175,6 +402,90 @@ class StaticWebsite(BaseProject):
                 terminate=True,
             )
 
+    def _minify_pages(self, project_root, dist_root, staging, pages, graph, budget):
+        """Minifies pages with one html-minifier call, from copies pointing at the built assets"""
+        source = os.path.join(staging, "pages")
+        minified = os.path.join(staging, "pages.min")
+        for page in pages:
+            page_path = os.path.join(source, page)
+            os.makedirs(os.path.dirname(page_path), exist_ok=True)
+            with open(page_path, "w") as f:
+                f.write(self._rewrite_page(project_root, page, graph))
+
+        minify_cmd = [
+            "npx",
+            self._minifier("html-minifier"),
+            "--input-dir",
+            source,
+            "--output-dir",
+            minified,
+            "--file-ext",
+            "html",
+            "--collapse-whitespace",
+            "--minify-css",
+            "--minify-js",
+        ]
+        budget.run(minify_cmd, cwd=project_root)
+
+        for page in pages:
+            output_path = os.path.join(dist_root, page)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            shutil.move(os.path.join(minified, page), output_path)
+        shutil.rmtree(source)
+        shutil.rmtree(minified)
+
+    def _minify_styles(self, project_root, dist_root, staging, outputs, targets, budget):
+        """Minifies stylesheets with one css-minify call"""
+        source = os.path.join(staging, "styles")
+        minified = os.path.join(staging, "styles.min")
+        os.makedirs(source)
+        # css-minify only reads the top of its input directory, so stage flat
+        for i, output in enumerate(outputs):
+            with open(os.path.join(source, f"{i}.css"), "w") as f:
+                f.write(self._rewrite_asset(project_root, targets[output][-1], output))
+
+        minify_cmd = ["npx", self._minifier("css-minify"), "-d", source, "-o", minified]
+        budget.run(minify_cmd, cwd=project_root)
+
+        for i, output in enumerate(outputs):
+            output_path = os.path.join(dist_root, output)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            shutil.move(os.path.join(minified, f"{i}.min.css"), output_path)
+        shutil.rmtree(source)
+        shutil.rmtree(minified)
+
+    def _minify_script(self, project_root, staging, output, path, graph, output_path, budget):
+        """Minifies a script on its own, importing the builds of its imports"""
+        source = os.path.join(staging, "scripts", path)
+        os.makedirs(os.path.dirname(source), exist_ok=True)
+        with open(source, "w") as f:
+            f.write(self._rewrite_asset(project_root, path, output))
+
+        js_minify_cmd = ["npx", self._minifier("uglify-js"), source, "-c", "-m", "-o", output_path]
+        if path in graph.modules:
+            js_minify_cmd.insert(3, "--module")
+        budget.run(js_minify_cmd, cwd=project_root)
+        os.remove(source)
+
+    def _minify_bundle(self, project_root, output_path, inputs, budget):
+        """Minifies inputs into one bundle, at most a chunk of files per uglify-js call"""
+        parts = []
+        for chunk in budget.chunks(inputs):
+            part = f"{output_path}.{len(parts)}.part"
+            js_minify_cmd = ["npx", self._minifier("uglify-js"), *chunk, "-c", "-m", "-o", part]
+            budget.run(js_minify_cmd, cwd=project_root)
+            parts.append(part)
+
+        if len(parts) == 1:
+            os.replace(parts[0], output_path)
+            return
+        with open(output_path, "wb") as bundle:
+            for part in parts:
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, bundle)
+                bundle.write(b";\n")
+                os.remove(part)
+
     def deploy(self):
         ...
 
@@ -182,8 +493,35 @@ class StaticWebsite(BaseProject):
         ...
 
     def serve(self):
-        dist, static = self.build()
-        self.server.run()
+        asyncio.run(self.aserve())
+
+    async def aserve(self):
+        """Binds the server right away and swaps in the new build once it is done"""
+        project_root = self._root()
+        # keep the release being served from being pruned by other builds
+        releases.pin(project_root, self.server.project_dist)
+        try:
+            serving = asyncio.create_task(self.server.arun())
+            building = asyncio.create_task(self._abuild_release())
+
+            done, _ = await asyncio.wait(
+                {serving, building}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if building in done:
+                release = building.result()
+                self.server.swap(release)
+                releases.pin(project_root, release)
+                releases.publish(project_root, release)
+            await serving
+        finally:
+            releases.unpin(project_root)
+
+    async def _abuild_release(self):
+        """Builds a new release and returns it, without blocking the loop"""
+        # seeding the release copies the current build, which takes a while
+        release = await asyncio.to_thread(releases.new_release, self._root())
+        await self.abuild(dist_root=release)
+        return release
 
 
 # registering classes
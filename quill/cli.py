@@ -3,11 +3,13 @@ from typing import Optional
 from typing_extensions import Annotated
 
 from quill.core.config import Config
-from quill.project import ProjectFactory
+from quill.project import ProjectFactory, distributed
 from quill.core.pretty import Pretty
+from quill.core.profiling import profiled
 import os
+import sys
 from pathlib import Path
-from quill.core.utils import load_module, load_dependent_modules
+from quill.core.utils import load_module, iter_dependent_modules
 
 cli = typer.Typer()
 pretty = Pretty()
@@ -37,20 +39,132 @@ def new(name: Annotated[Path, typer.Argument(help="Project name")]):
     config = Config.new(project_name=name)
 
 
+ProfileOption = Annotated[
+    Optional[str],
+    typer.Option(
+        "--profile",
+        help="Write a sampling profile to this path (.json for speedscope, collapsed stacks otherwise).",
+    ),
+]
+
+
+@cli.command()
+def build(
+    file_name: Annotated[Optional[str], typer.Argument()] = None,
+    profile: ProfileOption = None,
+    shards: Annotated[
+        int, typer.Option(help="Number of workers the build is sharded across.")
+    ] = 1,
+    shard: Annotated[
+        Optional[int],
+        typer.Option(help="Only build this shard into the store, as a worker."),
+    ] = None,
+    store: Annotated[
+        Optional[str],
+        typer.Option(help="Shared artifact store, a directory or s3://bucket/prefix."),
+    ] = None,
+    merge_only: Annotated[
+        bool,
+        typer.Option("--merge", help="Only merge the stored shards into dist."),
+    ] = False,
+    prepared: Annotated[
+        bool,
+        typer.Option(hidden=True, help="Build tools are already installed."),
+    ] = False,
+):
+    """
+    Builds a Quill project.
+    """
+    if file_name:
+        # modules register themselves on import, nothing to keep around
+        for _ in iter_dependent_modules(file_path=file_name):
+            pass
+    config = Config.init(file_name=file_name)
+    project = ProjectFactory().create_project(config=config)
+    sharded = shard is not None or shards > 1 or merge_only
+    if sharded and not store:
+        pretty.error(
+            error_type="BuildError",
+            message="Sharded builds need an artifact --store.",
+            terminate=True,
+        )
+
+    pretty.message(f"Building {project.name}...")
+    with profiled(profile):
+        if shard is not None:
+            distributed.run_worker(
+                project,
+                distributed.open_store(store),
+                shard=shard,
+                shards=shards,
+                prepare=not prepared,
+            )
+        elif sharded:
+            if not merge_only:
+                # install once here rather than in every worker process
+                project.prepare_build()
+                command = [sys.executable, "-m", "quill.cli", "build"]
+                if file_name:
+                    command.append(file_name)
+                distributed.run_local_workers(
+                    [*command, "--store", store, "--prepared"], shards
+                )
+            distributed.merge(project, distributed.open_store(store))
+        else:
+            project.build()
+
+
 # ✅
 @cli.command()
-def serve(file_name: Annotated[Optional[str], typer.Argument()] = None):
+def serve(
+    file_name: Annotated[Optional[str], typer.Argument()] = None,
+    profile: Annotated[
+        Optional[str],
+        typer.Option(
+            "--profile",
+            help=(
+                "Write a sampling profile to this path (.json for speedscope, collapsed stacks otherwise). "
+                "Request profiles go to <path>-requests and cover the event loop and the threadpool "
+                "running sync endpoints and static files."
+            ),
+        ),
+    ] = None,
+    profile_rate: Annotated[
+        float, typer.Option(help="Fraction of requests to profile, with --profile.")
+    ] = 0.01,
+    profile_requests: Annotated[
+        bool,
+        typer.Option(help="Start profiling requests right away, with --profile."),
+    ] = False,
+    profile_token: Annotated[
+        Optional[str],
+        typer.Option(
+            envvar="QUILL_PROFILE_TOKEN",
+            help="Token for the profiling admin endpoint, random if not set.",
+        ),
+    ] = None,
+):
     """
     Serves a Quill project.
     """
     if file_name:
         # module = load_module(file_name=file_name)
-        dependent_modules = load_dependent_modules(file_path=file_name)
+        for _ in iter_dependent_modules(file_path=file_name):
+            pass
     config = Config.init(file_name=file_name)
     project = ProjectFactory().create_project(config=config)
+    if profile:
+        # request profiles go next to the serve profile
+        project.server.enable_profiling(
+            output_dir=f"{os.path.splitext(profile)[0]}-requests",
+            rate=profile_rate,
+            enabled=profile_requests,
+            token=profile_token,
+        )
     pretty.message(f"Running {project.name}...")
-    project.serve()
+    with profiled(profile):
+        project.serve()
 
 
 if __name__ == "__main__":
-    typer.run(cli)
+    cli()
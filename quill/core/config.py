@@ -2,6 +2,7 @@ import os
 from abc import ABC
 from enum import Enum
 from pathlib import Path
+from typing import get_origin
 
 import toml
 import typer
@@ -27,6 +28,9 @@ class BaseConfig(ABC):
 
         # Iterate through the model's fields
         for field_name, field_info in cls.__annotations__.items():
+            if get_origin(field_info) is not None:
+                # structured fields like lists keep their defaults
+                continue
             if issubclass(field_info, BaseConfig):
                 # If the field is an instance of BaseConfig, call its collect method
                 pretty.info(f"{field_name.capitalize()}")
@@ -108,11 +112,29 @@ class ServerConfig(BaseModel, BaseConfig):
     )
 
 
+class BuildConfig(BaseModel, BaseConfig):
+    chunk_size: int = Field(
+        description="Most files minified by one minifier call, or concatenated by one uglify-js call",
+        default=256,
+        gt=0,
+    )
+    max_memory_mb: int = Field(
+        description="Memory ceiling of the build in MB, minifier calls shrink while it is exceeded, 0 for none",
+        default=0,
+        ge=0,
+    )
+    ignore: list[str] = Field(
+        description="Gitignore style patterns excluded from the build",
+        default_factory=list,
+    )
+
+
 class Config(BaseModel, BaseConfig):
     project: ProjectConfig = Field(..., description="Project config")
     bot: BotConfig = Field(..., description="Bot config")
     llm: LLMConfig = Field(..., description="LLM config")
     server: ServerConfig = Field(..., description="Server config")
+    build: BuildConfig = Field(default_factory=BuildConfig, description="Build config")
 
     @classmethod
     def init(cls, file_name: str = None):
@@ -145,6 +167,7 @@ class Config(BaseModel, BaseConfig):
         config.server = ServerConfig.model_construct(**config.server)
         config.bot = BotConfig.model_construct(**config.bot)
         config.project = ProjectConfig.model_construct(**config.project)
+        config.build = BuildConfig.model_construct(**quill_toml.get("build", {}))
 
         try:
             cls.model_validate(config)
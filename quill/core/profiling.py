@@ -0,0 +1,166 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional, Set, Tuple
+
+from quill.core.pretty import Pretty
+
+pretty = Pretty()
+
+Frame = Tuple[str, str, int]
+"""A stack frame as (function name, file name, line number)."""
+
+
+class SamplingProfiler:
+    """Samples the call stacks of running threads at a fixed interval."""
+
+    def __init__(
+        self,
+        interval: float = 0.005,
+        thread_ids: Optional[Set[int]] = None,
+        thread_names: Optional[Set[str]] = None,
+    ) -> None:
+        self.interval: float = interval
+        """Seconds between two samples."""
+
+        self.thread_ids: Optional[Set[int]] = thread_ids
+        """Threads to sample, every thread if neither these nor thread_names are given."""
+
+        self.thread_names: Optional[Set[str]] = thread_names
+        """Names of further threads to sample, e.g. of a pool whose threads come and go."""
+
+        self.samples: Counter = Counter()
+        """Number of times each stack, root first, was sampled."""
+
+        self.duration: float = 0.0
+        """Seconds the profiler was running."""
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Starts sampling in a background thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="quill-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops sampling and waits for the sampler to finish."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        started = time.perf_counter()
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if not self._samples(thread_id, names.get(thread_id)):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, frame.f_lineno))
+                    frame = frame.f_back
+                stack.append((names.get(thread_id, str(thread_id)), "", 0))
+                self.samples[tuple(reversed(stack))] += 1
+        self.duration = time.perf_counter() - started
+
+    def _samples(self, thread_id: int, name: Optional[str]) -> bool:
+        if self.thread_ids is None and self.thread_names is None:
+            return True
+        return thread_id in (self.thread_ids or ()) or name in (self.thread_names or ())
+
+    def write(self, path: str) -> None:
+        """Writes the samples as speedscope JSON if path ends with .json,
+        otherwise as collapsed stacks."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            if path.endswith(".json"):
+                json.dump(self.to_speedscope(name=os.path.basename(path)), f)
+            else:
+                f.write(self.to_collapsed())
+
+    def to_collapsed(self) -> str:
+        """Returns the samples in the collapsed stack format used by flamegraph tools."""
+        lines = [
+            ";".join(_label(frame) for frame in stack) + f" {count}"
+            for stack, count in self.samples.most_common()
+        ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def to_speedscope(self, name: str = "quill") -> dict:
+        """Returns the samples as a speedscope sampled profile."""
+        frames = []
+        indexes = {}
+        samples = []
+        weights = []
+        for stack, count in self.samples.items():
+            sample = []
+            for frame in stack:
+                if frame not in indexes:
+                    indexes[frame] = len(frames)
+                    function_name, file_name, line = frame
+                    frames.append({"name": function_name, "file": file_name, "line": line})
+                sample.append(indexes[frame])
+            samples.append(sample)
+            weights.append(count * self.interval)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+            "name": name,
+            "exporter": "quill",
+        }
+
+
+def _label(frame: Frame) -> str:
+    function_name, file_name, line = frame
+    if not file_name:
+        return function_name
+    return f"{function_name} ({os.path.basename(file_name)}:{line})"
+
+
+@contextmanager
+def profiled(path: Optional[str]) -> Iterator[Optional[SamplingProfiler]]:
+    """Profiles the enclosed block and writes the result to path, if given."""
+    if not path:
+        yield None
+        return
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.write(path)
+        pretty.success(f"Wrote profile to {path}")
@@ -1,11 +1,20 @@
+import gc
 import os
+import sys
 import click
+import fnmatch
 import importlib.util
 import inspect
 import subprocess
 import urllib.parse
-import pkgutil
 from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import toml
+
+from quill.core.pretty import Pretty
+
+pretty = Pretty()
 
 QUILL_DIR = Path(__file__).parent.parent
 
@@ -21,23 +30,184 @@ def load_module(file_name: Path | None):
 
 
 def load_dependent_modules(file_path):
+    """Loads every Python module next to file_path and returns them as a list."""
+    return list(iter_dependent_modules(file_path=file_path))
+
+
+def iter_dependent_modules(file_path, patterns: Sequence[str] = None):
+    """Loads the Python modules next to file_path one at a time, skipping ignored files."""
     # Get the directory containing the specified file
     file_path = os.path.join(os.getcwd(), file_path)
     directory = os.path.dirname(file_path)
+    if patterns is None:
+        patterns = load_ignore_patterns(directory)
+
+    for module_path in iter_files(
+        directory, suffixes=(".py",), patterns=patterns, recursive=False
+    ):
+        module_name = Path(module_path).stem
+        spec = importlib.util.spec_from_file_location(module_name, module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        yield module
+
+
+def load_ignore_patterns(root, extra: Sequence[str] = None) -> List[str]:
+    """Returns the ignore patterns from the .gitignore in root followed by extra.
+
+    extra defaults to the [build] ignore list of the quill.toml in root, for
+    callers that run before the config is loaded.
+    """
+    patterns = []
+
+    gitignore_path = os.path.join(root, ".gitignore")
+    if os.path.isfile(gitignore_path):
+        with open(gitignore_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    patterns.append(line)
+
+    if extra is None:
+        extra = []
+        quill_toml_path = os.path.join(root, "quill.toml")
+        if os.path.isfile(quill_toml_path):
+            with open(quill_toml_path, "r") as f:
+                quill_toml = toml.load(f=f)
+            extra = quill_toml.get("build", {}).get("ignore", [])
+    patterns.extend(extra)
+
+    return patterns
+
+
+def is_ignored(rel_path: str, is_dir: bool, patterns: Sequence[str]) -> bool:
+    """Matches rel_path against gitignore style patterns, the last match wins."""
+    ignored = False
+    name = os.path.basename(rel_path)
+    for pattern in patterns:
+        negated = pattern.startswith("!")
+        pattern = pattern[1:] if negated else pattern
+        if pattern.endswith("/"):
+            if not is_dir:
+                continue
+            pattern = pattern.rstrip("/")
+        if "/" in pattern:
+            matched = fnmatch.fnmatch(rel_path, pattern.lstrip("/"))
+        else:
+            matched = fnmatch.fnmatch(name, pattern)
+        if matched:
+            ignored = not negated
+    return ignored
+
+
+def iter_files(
+    root,
+    suffixes: Tuple[str, ...] = None,
+    patterns: Sequence[str] = (),
+    recursive: bool = True,
+) -> Iterator[str]:
+    """Yields the files below root in a stable order without listing the whole tree."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+
+        sub_directories = []
+        for entry in entries:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            rel_path = os.path.relpath(entry.path, root)
+            if is_ignored(rel_path, is_dir, patterns):
+                continue
+            if is_dir:
+                sub_directories.append(entry.path)
+            elif entry.is_file() and (suffixes is None or entry.name.endswith(suffixes)):
+                yield entry.path
+
+        if recursive:
+            stack.extend(reversed(sub_directories))
+
+
+def iter_chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yields lists of at most size items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def current_rss_mb() -> Optional[float]:
+    """Returns the resident memory of this process in MB, None where it can't be read."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+
+class MemoryBudget:
+    """Sizes chunks of work so that building stays under a memory ceiling.
+
+    Chunks halve while this process, or the last tool run on a chunk, uses
+    more than max_memory_mb, and grow back once usage drops below three
+    quarters of it. A ceiling of 0 disables the budget.
+    """
+
+    def __init__(self, size: int, max_memory_mb: int = 0) -> None:
+        self.size: int = size
+        """Largest chunk size."""
+
+        self.max_memory_mb: int = max_memory_mb
+        """Memory ceiling in MB, 0 for none."""
+
+        self.chunk_size: int = size
+        """Size of the next chunk."""
+
+        self.tool_peak_mb: float = 0.0
+        """Peak resident memory of the last tool run, in MB."""
+
+        if max_memory_mb and current_rss_mb() is None:
+            pretty.info("Memory ceiling ignored, resident memory can't be read on this platform.")
+            self.max_memory_mb = 0
 
-    # Create a list to store loaded modules
-    loaded_modules = []
+    def chunks(self, iterable: Iterable) -> Iterator[list]:
+        """Yields lists of at most chunk_size items, resizing after each one is processed."""
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+                self._resize()
+        if chunk:
+            yield chunk
 
-    # Walk through the directory and load all Python modules
-    for loader, module_name, is_pkg in pkgutil.walk_packages([directory]):
-        if not is_pkg:
-            module_path = os.path.join(directory, f"{module_name}.py")
+    def run(self, cmd: List[str], **kwargs) -> None:
+        """Runs cmd like subprocess.run with check=True, recording its peak memory."""
+        process = subprocess.Popen(cmd, **kwargs)
+        # unlike subprocess.run, wait4 reports the memory the tool and its children used
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # kilobytes, bytes on macOS
+        self.tool_peak_mb = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
 
-            # Check if the module file exists
-            if os.path.exists(module_path):
-                spec = importlib.util.spec_from_file_location(module_name, module_path)
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                loaded_modules.append(module)
+    def _used_mb(self) -> float:
+        return max(current_rss_mb() or 0.0, self.tool_peak_mb)
 
-    return loaded_modules
+    def _resize(self) -> None:
+        if not self.max_memory_mb:
+            return
+        if self._used_mb() > self.max_memory_mb:
+            gc.collect()
+        used = self._used_mb()
+        if used > self.max_memory_mb:
+            self.chunk_size = max(1, self.chunk_size // 2)
+        elif used < 0.75 * self.max_memory_mb:
+            self.chunk_size = min(self.size, self.chunk_size * 2)
@@ -2,3 +2,5 @@ from pkgutil import extend_path
 __path__ = extend_path(__path__, __name__)
 
 from quill.project.base import BaseProject, ProjectFactory
+from quill.project.graph import AssetGraph
+from quill.project.distributed import ArtifactStore, LocalArtifactStore, S3ArtifactStore
@@ -1,5 +1,6 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Mapping
+from typing import List, Mapping
 
 from quill.bot import BaseBot, BotFactory
 from quill.core.config import Config
@@ -41,6 +42,25 @@ class BaseProject(ABC):
     def build(self):
         """Builds a project"""
 
+    async def abuild(self, *args, **kwargs):
+        """Builds a project without blocking the event loop"""
+        return await asyncio.to_thread(self.build, *args, **kwargs)
+
+    @abstractmethod
+    def targets(self) -> Mapping[str, List[str]]:
+        """Returns the build outputs mapped to their input files, for sharded builds"""
+
+    @abstractmethod
+    def build_targets(self, targets: Mapping[str, List[str]], dist_root: str):
+        """Builds only the given targets into dist_root, for sharded builds"""
+
+    def prepare_build(self):
+        """Installs what build_targets needs, once per machine before sharded builds"""
+
+    def build_fingerprint(self) -> str:
+        """Identifies the tools build_targets uses, outputs of other tools aren't reused"""
+        return ""
+
     @abstractmethod
     def deploy(self):
         """Deploys a project"""
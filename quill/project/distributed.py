@@ -0,0 +1,231 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from abc import ABC, abstractmethod
+from typing import List, Mapping, Sequence
+
+from quill.core.pretty import Pretty
+from quill.project import releases
+from quill.project.base import BaseProject
+
+pretty = Pretty()
+
+KEY_VERSION = "1"
+"""Bumped whenever the way outputs are produced changes, invalidating stored artifacts."""
+
+
+class ArtifactStore(ABC):
+    """Storage for build outputs shared between build workers."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Returns whether an artifact is stored under key."""
+
+    @abstractmethod
+    def get(self, key: str, path: str) -> None:
+        """Downloads the artifact stored under key to path."""
+
+    @abstractmethod
+    def put(self, key: str, path: str) -> None:
+        """Uploads the file at path under key."""
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Artifact store backed by a directory, e.g. on a shared volume."""
+
+    def __init__(self, root: str) -> None:
+        self.root: str = root
+        """Directory the artifacts are stored in."""
+
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def get(self, key: str, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        shutil.copyfile(self._path(key), path)
+
+    def put(self, key: str, path: str) -> None:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # copy then rename so concurrent workers never see a partial artifact
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target))
+        os.close(fd)
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+
+
+class S3ArtifactStore(ArtifactStore):
+    """Artifact store backed by an S3 compatible bucket.
+
+    Any client exposing head_object, download_file and upload_file like
+    boto3's does can be passed in, boto3 is used otherwise. Missing objects
+    must raise an error with a boto style response carrying a 404 code.
+    """
+
+    def __init__(self, bucket: str, prefix: str = "", client=None) -> None:
+        self.bucket: str = bucket
+        """Bucket the artifacts are stored in."""
+
+        self.prefix: str = prefix.strip("/")
+        """Key prefix of the artifacts inside the bucket."""
+
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                pretty.error(
+                    error_type="ImportError",
+                    message="boto3 is required for s3:// artifact stores.",
+                    terminate=True,
+                )
+            client = boto3.client("s3")
+        self.client = client
+        """S3 client used for the transfers."""
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            # only a missing object is a cache miss, auth and network errors are not
+            error = getattr(e, "response", None) or {}
+            if error.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    def get(self, key: str, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.client.download_file(self.bucket, self._key(key), path)
+
+    def put(self, key: str, path: str) -> None:
+        self.client.upload_file(path, self.bucket, self._key(key))
+
+
+def open_store(location: str) -> ArtifactStore:
+    """Opens the store at an s3://bucket/prefix URL or a local directory."""
+    if location.startswith("s3://"):
+        bucket, _, prefix = location[len("s3://") :].partition("/")
+        return S3ArtifactStore(bucket=bucket, prefix=prefix)
+    return LocalArtifactStore(location)
+
+
+def shard_of(output: str, shards: int) -> int:
+    """Returns the shard an output is built by."""
+    return int(hashlib.sha1(output.encode()).hexdigest(), 16) % shards
+
+
+def artifact_key(
+    project_root: str, output: str, inputs: Sequence[str], fingerprint: str = ""
+) -> str:
+    """Returns the store key of an output, derived from the contents of its inputs
+    and the fingerprint of the tools building it."""
+    digest = hashlib.sha1(f"{KEY_VERSION}\0{fingerprint}\0{output}".encode())
+    for path in inputs:
+        digest.update(f"\0{path}\0".encode())
+        with open(os.path.join(project_root, path), "rb") as f:
+            for block in iter(lambda: f.read(1 << 16), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _project_root(project: BaseProject) -> str:
+    return os.getcwd() if project.project_root == "." else str(project.project_root)
+
+
+def run_worker(
+    project: BaseProject,
+    store: ArtifactStore,
+    shard: int,
+    shards: int,
+    prepare: bool = True,
+) -> int:
+    """Builds the outputs of one shard that are missing from the store.
+
+    Unless prepare is False, project.prepare_build runs first when anything
+    is missing. Returns the number of outputs built.
+    """
+    if not 0 <= shard < shards:
+        pretty.error(
+            error_type="BuildError",
+            message=f"Shard {shard} is out of range for {shards} shards.",
+            terminate=True,
+        )
+
+    project_root = _project_root(project)
+    fingerprint = project.build_fingerprint()
+    missing = {}
+    keys = {}
+    for output, inputs in project.targets().items():
+        if shard_of(output, shards) != shard:
+            continue
+        key = artifact_key(project_root, output, inputs, fingerprint)
+        if not store.exists(key):
+            missing[output] = inputs
+            keys[output] = key
+
+    pretty.info(f"Shard {shard}/{shards}: building {len(missing)} assets")
+    if not missing:
+        return 0
+
+    if prepare:
+        project.prepare_build()
+    dist_root = tempfile.mkdtemp(prefix=f"quill-shard-{shard}-")
+    try:
+        project.build_targets(missing, dist_root)
+        for output, key in keys.items():
+            store.put(key, os.path.join(dist_root, output))
+    finally:
+        shutil.rmtree(dist_root, ignore_errors=True)
+
+    return len(missing)
+
+
+def run_local_workers(command: List[str], shards: int) -> None:
+    """Runs one worker process per shard, command is extended with the shard index."""
+    workers = [
+        subprocess.Popen([*command, "--shard", str(shard), "--shards", str(shards)])
+        for shard in range(shards)
+    ]
+    failed = [shard for shard, worker in enumerate(workers) if worker.wait() != 0]
+    if failed:
+        pretty.error(
+            error_type="BuildError",
+            message=f"Build workers for shards {failed} failed.",
+            terminate=True,
+        )
+
+
+def merge(project: BaseProject, store: ArtifactStore) -> None:
+    """Publishes a release assembled from the stored outputs of every shard as dist."""
+    project_root = _project_root(project)
+    fingerprint = project.build_fingerprint()
+    release = releases.new_release(project_root, seed=False)
+
+    missing = []
+    for output, inputs in project.targets().items():
+        key = artifact_key(project_root, output, inputs, fingerprint)
+        if not store.exists(key):
+            missing.append(output)
+            continue
+        store.get(key, os.path.join(release, output))
+
+    if missing:
+        shutil.rmtree(release, ignore_errors=True)
+        pretty.error(
+            error_type="BuildError",
+            message=f"Missing build artifacts for {', '.join(sorted(missing))}.",
+            terminate=True,
+        )
+
+    releases.publish(project_root, release)
+    pretty.success(f"Merged build into {os.path.join(project_root, 'dist')}")
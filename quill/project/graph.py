@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import re
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Set
+from urllib.parse import urlsplit
+
+from quill.core.utils import iter_files
+
+ASSET_SUFFIXES = (".html", ".js", ".css")
+"""File types tracked by the asset graph."""
+
+IGNORED_PATTERNS = ["dist/", "node_modules/", ".quill/", ".git/", "__pycache__/"]
+"""Directories never scanned for assets."""
+
+REFERENCE_PATTERNS: Mapping[str, List[re.Pattern]] = {
+    ".html": [
+        re.compile(r"<script\b[^>]*\bsrc\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE),
+        re.compile(r"<link\b[^>]*\bhref\s*=\s*[\"']([^\"']+)[\"']", re.IGNORECASE),
+    ],
+    ".js": [
+        re.compile(r"\bimport\s+(?:[^\"'();]+?\s+from\s+)?[\"']([^\"']+)[\"']"),
+        re.compile(r"\bimport\s*\(\s*[\"']([^\"']+)[\"']\s*\)"),
+    ],
+    ".css": [
+        re.compile(r"@import\s+(?:url\(\s*)?[\"']?([^\"')\s;]+)[\"']?\s*\)?"),
+    ],
+}
+"""Patterns extracting referenced paths, keyed by the suffix of the referencing file."""
+
+MODULE_SCRIPT = re.compile(
+    r"<script\b(?=[^>]*\btype\s*=\s*[\"']?module\b)[^>]*\bsrc\s*=\s*[\"']([^\"']+)[\"']",
+    re.IGNORECASE,
+)
+"""Script tags loading an ES module, the URL in the first group."""
+
+MODULE_SYNTAX = re.compile(r"^\s*(?:import\s*[\w*{\"']|export\b)", re.MULTILINE)
+"""Top level import and export statements, which only ES modules may contain."""
+
+
+class AssetGraph:
+    """Dependency graph of the HTML, JS and CSS assets of a project."""
+
+    def __init__(self, root: str) -> None:
+        self.root: str = root
+        """Directory the asset paths are relative to."""
+
+        self.hashes: Dict[str, str] = {}
+        """Mapping of asset paths to the digest of their contents."""
+
+        self.edges: Dict[str, List[str]] = {}
+        """Mapping of asset paths to the assets they reference, in reference order."""
+
+        self.modules: Set[str] = set()
+        """Scripts loaded as ES modules, by a module script tag, an import or their own syntax."""
+
+    @classmethod
+    def scan(cls, root: str, patterns: Sequence[str] = ()) -> "AssetGraph":
+        """Builds the graph by scanning every asset below root not matched by patterns."""
+        graph = cls(root)
+        references = {}
+        modules = set()
+
+        for file_path in iter_files(
+            root, suffixes=ASSET_SUFFIXES, patterns=[*IGNORED_PATTERNS, *patterns]
+        ):
+            path = os.path.relpath(file_path, root)
+            with open(file_path, "rb") as f:
+                content = f.read()
+            graph.hashes[path] = hashlib.sha1(content).hexdigest()
+            text = content.decode(errors="ignore")
+            references[path] = cls._references(path, text)
+            if path.endswith(".html"):
+                modules.update(
+                    ref
+                    for match in MODULE_SCRIPT.finditer(text)
+                    if (ref := cls.resolve(path, match.group(1))) is not None
+                )
+            elif path.endswith(".js") and MODULE_SYNTAX.search(text):
+                modules.add(path)
+
+        for path, refs in references.items():
+            graph.edges[path] = [ref for ref in refs if ref in graph.hashes]
+            if path.endswith(".js"):
+                # whatever a script imports is loaded as a module
+                modules.update(graph.edges[path])
+
+        graph.modules = {path for path in modules if path in graph.hashes}
+
+        return graph
+
+    @staticmethod
+    def resolve(path: str, url: str) -> Optional[str]:
+        """Returns the asset path url refers to from the asset at path, None if external."""
+        url = urlsplit(url)
+        if url.scheme or url.netloc or not url.path:
+            return None
+        if url.path.startswith("/"):
+            return os.path.normpath(url.path.lstrip("/"))
+        return os.path.normpath(os.path.join(os.path.dirname(path), url.path))
+
+    @classmethod
+    def _references(cls, path: str, content: str) -> List[str]:
+        """Returns the normalized paths referenced by the asset at path."""
+        refs = []
+        for pattern in REFERENCE_PATTERNS[os.path.splitext(path)[1]]:
+            for match in pattern.finditer(content):
+                ref = cls.resolve(path, match.group(1))
+                if ref is not None and ref not in refs:
+                    refs.append(ref)
+        return refs
+
+    @classmethod
+    def rewrite(
+        cls, path: str, content: str, replace: Callable[[str], Optional[str]]
+    ) -> str:
+        """Returns content with every reference URL replaced by what replace maps its asset to.
+
+        References replace maps to None, and external ones, are left as they are.
+        """
+        spans = {}
+        for pattern in REFERENCE_PATTERNS[os.path.splitext(path)[1]]:
+            for match in pattern.finditer(content):
+                ref = cls.resolve(path, match.group(1))
+                url = replace(ref) if ref is not None else None
+                if url is not None:
+                    spans[match.span(1)] = url
+
+        parts = []
+        end = 0
+        for (start, stop), url in sorted(spans.items()):
+            parts.append(content[end:start])
+            parts.append(url)
+            end = stop
+        parts.append(content[end:])
+        return "".join(parts)
+
+    @classmethod
+    def load(cls, root: str, path: str) -> Optional["AssetGraph"]:
+        """Loads a graph persisted by save, or None if there is none."""
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as f:
+            data = json.load(f)
+        graph = cls(root)
+        graph.hashes = data.get("hashes", {})
+        graph.edges = data.get("edges", {})
+        graph.modules = set(data.get("modules", []))
+        return graph
+
+    def save(self, path: str) -> None:
+        """Persists the graph as JSON."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {"hashes": self.hashes, "edges": self.edges, "modules": sorted(self.modules)},
+                f,
+                indent=2,
+            )
+
+    def changed(self, previous: Optional["AssetGraph"]) -> Set[str]:
+        """Returns the assets added, removed or modified since previous."""
+        if previous is None:
+            return set(self.hashes)
+        paths = set(self.hashes) | set(previous.hashes)
+        return {p for p in paths if self.hashes.get(p) != previous.hashes.get(p)}
+
+    def closure(self, entry: str, suffix: str) -> List[str]:
+        """Returns the assets with suffix reachable from entry, dependencies first."""
+        ordered: List[str] = []
+        seen: Set[str] = {entry}
+        # iterative post-order walk, deep import chains would overflow the stack
+        stack = [(entry, iter(self.edges.get(entry, [])))]
+        while stack:
+            path, refs = stack[-1]
+            ref = next((r for r in refs if r not in seen), None)
+            if ref is not None:
+                seen.add(ref)
+                stack.append((ref, iter(self.edges.get(ref, []))))
+                continue
+            stack.pop()
+            if path.endswith(suffix):
+                ordered.append(path)
+        return ordered
+
+    def entries(self) -> List[str]:
+        """Returns the assets that start a bundle.
+
+        Every HTML page is an entry, as is every script that no other asset
+        references, so that no script is left out of the build.
+        """
+        referenced = {ref for refs in self.edges.values() for ref in refs}
+        return [
+            path
+            for path in self.hashes
+            if path.endswith(".html")
+            or (path.endswith(".js") and path not in referenced)
+        ]
@@ -0,0 +1,107 @@
+import os
+import shutil
+import time
+from typing import Optional, Set
+
+RELEASES_DIR = os.path.join(".quill", "releases")
+"""Directory, relative to the project root, builds are published from."""
+
+PINS_DIR = os.path.join(".quill", "pins")
+"""Directory, relative to the project root, where running servers pin their release."""
+
+
+def new_release(project_root: str, seed: bool = True) -> str:
+    """Creates a release directory, seeded with the published build unless seed is False."""
+    dist_root = os.path.join(project_root, "dist")
+    release = os.path.join(project_root, RELEASES_DIR, str(time.time_ns()))
+
+    if seed and os.path.isdir(dist_root):
+        # reuse the current outputs so the build stays incremental
+        shutil.copytree(os.path.realpath(dist_root), release, symlinks=True)
+    else:
+        os.makedirs(release)
+
+    return release
+
+
+def publish(project_root: str, release: str, keep: int = 2) -> None:
+    """Atomically points dist at release and prunes the releases nothing uses.
+
+    The keep newest releases are kept, as are the release dist pointed at
+    until now and every release pinned by a running server.
+    """
+    dist_root = os.path.join(project_root, "dist")
+    previous = os.path.realpath(dist_root) if os.path.islink(dist_root) else None
+
+    link = f"{dist_root}.{os.getpid()}.tmp"
+    os.symlink(release, link)
+    if os.path.isdir(dist_root) and not os.path.islink(dist_root):
+        # dist from before releases existed, only happens once
+        shutil.rmtree(dist_root)
+    os.replace(link, dist_root)
+
+    used = {os.path.realpath(release), previous, *pinned(project_root)}
+    releases_root = os.path.join(project_root, RELEASES_DIR)
+    names = sorted(os.listdir(releases_root), key=int)
+    for name in names[:-keep]:
+        path = os.path.realpath(os.path.join(releases_root, name))
+        if path not in used:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def pin(project_root: str, release: str) -> None:
+    """Keeps release from being pruned for as long as this process runs."""
+    pins_root = os.path.join(project_root, PINS_DIR)
+    os.makedirs(pins_root, exist_ok=True)
+    path = os.path.join(pins_root, str(os.getpid()))
+    with open(f"{path}.tmp", "w") as f:
+        f.write(os.path.realpath(release))
+    os.replace(f"{path}.tmp", path)
+
+
+def unpin(project_root: str) -> None:
+    """Drops the pin of this process."""
+    path = os.path.join(project_root, PINS_DIR, str(os.getpid()))
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def pinned(project_root: str) -> Set[str]:
+    """Returns the releases pinned by running processes, dropping pins of dead ones."""
+    pins_root = os.path.join(project_root, PINS_DIR)
+    if not os.path.isdir(pins_root):
+        return set()
+
+    releases = set()
+    for name in os.listdir(pins_root):
+        if not name.isdigit():
+            continue
+        path = os.path.join(pins_root, name)
+        release = _read_pin(path)
+        if release is None:
+            continue
+        if _alive(int(name)):
+            releases.add(release)
+        else:
+            os.remove(path)
+    return releases
+
+
+def _read_pin(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        # unpinned meanwhile
+        return None
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # someone else's process
+        return True
+    return True
@@ -1,4 +1,6 @@
 from pkgutil import extend_path
 __path__ = extend_path(__path__, __name__)
 
-from quill.server.base import BaseServer, ServerFactory
\ No newline at end of file
+from quill.server.base import BaseServer, ServerFactory
+from quill.server.profiling import RequestProfiling
+from quill.server.admission import AdaptiveLimit, AdmissionControl, RouteClass
@@ -0,0 +1,303 @@
+import asyncio
+import heapq
+import itertools
+import json
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Set
+
+ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-f]{16,}|[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12})$", re.IGNORECASE
+)
+"""Path segments holding ids, which don't tell routes apart."""
+
+
+class RouteClass:
+    """A group of routes sharing admission limits."""
+
+    def __init__(
+        self,
+        name: str,
+        pattern: str = "",
+        methods: Optional[Sequence[str]] = None,
+        priority: int = 1,
+        max_concurrency: Optional[int] = None,
+        max_queue: int = 100,
+        queue_timeout: float = 5.0,
+        adaptive: bool = True,
+        retry_after: int = 1,
+    ) -> None:
+        self.name: str = name
+        """Name of the route class."""
+
+        self.pattern: re.Pattern = re.compile(pattern)
+        """Regex searched in the request path, an empty pattern matches everything."""
+
+        self.methods: Optional[Set[str]] = {m.upper() for m in methods} if methods else None
+        """HTTP methods the class applies to, None for all of them."""
+
+        self.priority: int = priority
+        """Queued requests with a lower priority are admitted first."""
+
+        self.max_concurrency: Optional[int] = max_concurrency
+        """Requests of this class handled at once, None for no cap."""
+
+        self.max_queue: int = max_queue
+        """Requests of this class waiting at once before new ones are rejected."""
+
+        self.queue_timeout: float = queue_timeout
+        """Seconds a request may wait for admission before it is rejected."""
+
+        self.adaptive: bool = adaptive
+        """Whether requests count against, and tune, the shared adaptive limit."""
+
+        self.retry_after: int = retry_after
+        """Seconds sent in the Retry-After header of rejections."""
+
+        self.inflight: int = 0
+        self.queued: int = 0
+
+
+def default_routes() -> List[RouteClass]:
+    """Returns the route classes used when none are given."""
+    # cheap static assets and pages are kept off the shared limit so they stay fast,
+    # writes, e.g. generation requests, queue behind everything else
+    return [
+        RouteClass(
+            "static",
+            pattern=r"(^|/)static/",
+            priority=0,
+            max_concurrency=256,
+            adaptive=False,
+        ),
+        RouteClass(
+            "pages",
+            pattern=r"(/|\.html?)$",
+            methods=["GET", "HEAD"],
+            priority=0,
+            max_concurrency=256,
+            adaptive=False,
+        ),
+        RouteClass(
+            "generation",
+            methods=["POST", "PUT", "PATCH", "DELETE"],
+            priority=2,
+            queue_timeout=30.0,
+        ),
+    ]
+
+
+def route_template(method: str, path: str) -> str:
+    """Returns the route a request is for, with id segments of path replaced."""
+    segments = ["{id}" if ID_SEGMENT.match(s) else s for s in path.split("/")]
+    return f"{method.upper()} {'/'.join(segments)}"
+
+
+class AdaptiveLimit:
+    """Concurrency limit tuned by additive increase, multiplicative decrease on latency.
+
+    Overload is judged per route, against the lowest latency recently seen
+    for that route, so routes that are slow by nature don't shrink the limit
+    on their own. Like TCP, the limit is cut at most once per round trip:
+    requests started before the last cut don't cut it again.
+    """
+
+    def __init__(
+        self,
+        initial: int = 32,
+        min_limit: int = 1,
+        max_limit: int = 512,
+        tolerance: float = 2.0,
+        drift: float = 0.01,
+        backoff: float = 0.9,
+        max_routes: int = 1024,
+    ) -> None:
+        self.limit: float = initial
+        """Current number of requests allowed at once."""
+
+        self.min_limit: int = min_limit
+        """Floor of the limit."""
+
+        self.max_limit: int = max_limit
+        """Ceiling of the limit."""
+
+        self.tolerance: float = tolerance
+        """Latency, as a multiple of the baseline, above which a request counts as overload."""
+
+        self.drift: float = drift
+        """Fraction the baselines rise by per request, to follow routes that got slower."""
+
+        self.backoff: float = backoff
+        """Factor the limit is multiplied by on overload."""
+
+        self.max_routes: int = max_routes
+        """Routes tracked at most, requests to further routes share their class's baseline."""
+
+        self.baselines: Dict[str, float] = {}
+        """Lowest recent latency of each route."""
+
+        self.last_decrease: float = float("-inf")
+        """Monotonic time the limit was last cut at."""
+
+    def update(self, key: str, latency: float, started: float) -> None:
+        """Adjusts the limit with a finished request to route key, started at the given
+        monotonic time."""
+        baseline = self.baselines.get(key, latency)
+        baseline = min(latency, baseline * (1 + self.drift))
+        self.baselines[key] = baseline
+
+        if latency > self.tolerance * baseline:
+            if started >= self.last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease = started + latency
+        else:
+            # grows by about one per limit requests, i.e. one per round trip
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+class AdmissionControl:
+    """ASGI middleware admitting requests by route class and shedding load with 503s."""
+
+    def __init__(
+        self,
+        app,
+        routes: Optional[List[RouteClass]] = None,
+        default: Optional[RouteClass] = None,
+        limit: Optional[AdaptiveLimit] = None,
+    ) -> None:
+        self.app = app
+        """Wrapped ASGI app."""
+
+        self.routes: List[RouteClass] = default_routes() if routes is None else routes
+        """Route classes, the first matching a path is used."""
+
+        self.default: RouteClass = default or RouteClass("default")
+        """Route class of paths no other class matches."""
+
+        self.limit: AdaptiveLimit = limit or AdaptiveLimit()
+        """Shared limit of the adaptive route classes."""
+
+        self.inflight: int = 0
+        """Adaptive requests being handled."""
+
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def classify(self, path: str, method: str = "GET") -> RouteClass:
+        """Returns the route class of a request."""
+        for route in self.routes:
+            if route.methods is not None and method.upper() not in route.methods:
+                continue
+            if route.pattern.search(path):
+                return route
+        return self.default
+
+    def _has_capacity(self, route: RouteClass) -> bool:
+        if route.max_concurrency is not None and route.inflight >= route.max_concurrency:
+            return False
+        return not route.adaptive or self.inflight < int(self.limit.limit)
+
+    def _admit(self, route: RouteClass) -> None:
+        route.inflight += 1
+        if route.adaptive:
+            self.inflight += 1
+
+    def _baseline_key(self, route: RouteClass, method: str, path: str) -> str:
+        key = f"{route.name} {route_template(method, path)}"
+        if key in self.limit.baselines or len(self.limit.baselines) < self.limit.max_routes:
+            return key
+        return route.name
+
+    def _release(
+        self,
+        route: RouteClass,
+        key: Optional[str] = None,
+        started: Optional[float] = None,
+    ) -> None:
+        """Frees the slot of a request, tuning the limit if it was handled from started on."""
+        route.inflight -= 1
+        if route.adaptive:
+            self.inflight -= 1
+            if started is not None:
+                self.limit.update(key, time.monotonic() - started, started)
+        self._wake()
+
+    def _wake(self) -> None:
+        """Admits waiting requests in priority order while there is capacity."""
+        skipped = []
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            _, _, route, future = entry
+            if future.done():
+                continue
+            if self._has_capacity(route):
+                self._admit(route)
+                future.set_result(None)
+            else:
+                skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    async def _acquire(self, route: RouteClass) -> bool:
+        """Waits for admission, returns False if the request should be rejected."""
+        # waiters are woken on every release, so whoever is still queued
+        # lacks capacity and cannot be overtaken by a request that has it
+        if self._has_capacity(route):
+            self._admit(route)
+            return True
+        if route.queued >= route.max_queue:
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (route.priority, next(self._sequence), route, future))
+        route.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=route.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            if future.done():
+                # admitted just as the deadline passed
+                return True
+            future.cancel()
+            return False
+        except asyncio.CancelledError:
+            # the client went away while queued, give back a slot granted meanwhile
+            if future.done() and not future.cancelled():
+                self._release(route)
+            future.cancel()
+            raise
+        finally:
+            route.queued -= 1
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        route = self.classify(scope["path"], method)
+        if not await self._acquire(route):
+            await self._reject(route, send)
+            return
+
+        key = self._baseline_key(route, method, scope["path"]) if route.adaptive else None
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._release(route, key, started)
+
+    async def _reject(self, route: RouteClass, send) -> None:
+        body = json.dumps({"detail": "Server overloaded, retry later"}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(route.retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -1,8 +1,11 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Mapping, Optional
+from typing import List, Mapping, Optional
 
 from quill.core.config import Config
 from quill.core.types import ServerTypes, SingletonMeta
+from quill.server.admission import AdaptiveLimit, AdmissionControl, RouteClass
+from quill.server.profiling import RequestProfiling
 from fastapi import FastAPI
 
 class BaseServer(ABC):
@@ -12,6 +15,8 @@ class BaseServer(ABC):
         self.name: ServerTypes = None
         self.app = None
         """server instance"""
+        self.profiling: RequestProfiling = None
+        """Request profiling, if enabled."""
         self.init(config=config)
         """Name of the server."""
     @abstractmethod
@@ -22,6 +27,47 @@ class BaseServer(ABC):
     def run(self, port: Optional[int]):
         """Runs the server."""
 
+    async def arun(self, port: Optional[int] = None):
+        """Runs the server without blocking the event loop."""
+        if port is None:
+            await asyncio.to_thread(self.run)
+        else:
+            await asyncio.to_thread(self.run, port)
+
+    def enable_profiling(
+        self,
+        output_dir: str,
+        rate: float = 0.01,
+        enabled: bool = False,
+        token: Optional[str] = None,
+    ):
+        """Installs per-request profiling, toggled at runtime through its admin endpoint.
+
+        The endpoint requires token, a random one is generated and printed if none is given.
+        """
+        self.profiling = RequestProfiling(
+            output_dir=output_dir, rate=rate, enabled=enabled, token=token
+        )
+        self.profiling.install(self.app)
+
+    def enable_admission_control(
+        self,
+        routes: Optional[List[RouteClass]] = None,
+        default: Optional[RouteClass] = None,
+        limit: Optional[AdaptiveLimit] = None,
+    ):
+        """Installs admission control, rejecting requests with 503 when overloaded.
+
+        Static assets and pages get their own limits by default, while
+        generation requests and every other route share an adaptive limit
+        tuned on latency relative to each route's own baseline.
+        """
+        self.app.add_middleware(AdmissionControl, routes=routes, default=default, limit=limit)
+
+    @abstractmethod
+    def swap(self, path: str):
+        """Points the server at a new build output directory."""
+
 
 class ServerFactory(metaclass=SingletonMeta):
     """Factory for creating server instances."""
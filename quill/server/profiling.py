@@ -0,0 +1,131 @@
+import asyncio
+import os
+import random
+import secrets
+import threading
+import time
+from typing import Optional
+
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Request
+
+from quill.core.pretty import Pretty
+from quill.core.profiling import SamplingProfiler
+
+pretty = Pretty()
+
+ADMIN_PATH = "/_quill/profile"
+"""Path of the endpoint that toggles request profiling."""
+
+TOKEN_HEADER = "X-Quill-Token"
+"""Header carrying the token the admin endpoint requires."""
+
+THREADPOOL_NAME = "AnyIO worker thread"
+"""Name of the threads Starlette runs sync endpoints and file I/O in."""
+
+SAMPLED_THREADS = ["event loop", "threadpool"]
+"""Threads request profiles cover, as reported by the admin endpoint."""
+
+
+class RequestProfiling:
+    """Profiles a sampled fraction of the requests handled by an app.
+
+    The event loop thread and the threadpool running sync endpoints and
+    static file I/O are sampled, for as long as a profiled request is in
+    flight. Work of requests handled concurrently shows up in the same
+    profile, so profile under light traffic for a clean picture. Samples of
+    the loop waiting for I/O and of idle pool threads are dropped.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        rate: float = 0.01,
+        enabled: bool = False,
+        token: Optional[str] = None,
+    ) -> None:
+        self.output_dir: str = output_dir
+        """Directory the request profiles are written to."""
+
+        self.rate: float = rate
+        """Fraction of requests that get profiled."""
+
+        self.enabled: bool = enabled
+        """Whether requests are being profiled."""
+
+        self.token: str = token or secrets.token_urlsafe(16)
+        """Token the admin endpoint requires in the X-Quill-Token header."""
+
+        self._active = False
+
+    def install(self, app: FastAPI) -> None:
+        """Adds the profiling middleware and admin endpoint to app."""
+        app.middleware("http")(self.middleware)
+
+        router = APIRouter()
+        router.add_api_route(ADMIN_PATH, self.status, methods=["GET"])
+        router.add_api_route(ADMIN_PATH, self.update, methods=["POST"])
+        # prepend, a mount at "/" would otherwise shadow the endpoint
+        app.router.routes[:0] = router.routes
+        pretty.info(f"Request profiling token for {ADMIN_PATH}: {self.token}")
+
+    async def middleware(self, request: Request, call_next):
+        # profile one request at a time to keep the overhead bounded
+        if not self.enabled or self._active or random.random() >= self.rate:
+            return await call_next(request)
+
+        self._active = True
+        profiler = SamplingProfiler(
+            thread_ids={threading.get_ident()}, thread_names={THREADPOOL_NAME}
+        )
+        profiler.start()
+        try:
+            return await call_next(request)
+        finally:
+            path = request.url.path.strip("/").replace("/", "_") or "root"
+            file_name = f"{time.time_ns()}-{request.method.lower()}-{path}.collapsed"
+            # joining the sampler and writing the file would block the loop
+            await asyncio.to_thread(self._finish, profiler, file_name)
+            self._active = False
+
+    def _finish(self, profiler: SamplingProfiler, file_name: str) -> None:
+        profiler.stop()
+        for stack in list(profiler.samples):
+            if _idle(stack):
+                del profiler.samples[stack]
+        profiler.write(os.path.join(self.output_dir, file_name))
+
+    def _authorize(self, token: Optional[str]) -> None:
+        if token is None or not secrets.compare_digest(token, self.token):
+            raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+    async def status(self, x_quill_token: Optional[str] = Header(None)):
+        self._authorize(x_quill_token)
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "output_dir": self.output_dir,
+            "sampled_threads": SAMPLED_THREADS,
+        }
+
+    async def update(
+        self,
+        enabled: Optional[bool] = None,
+        rate: Optional[float] = None,
+        x_quill_token: Optional[str] = Header(None),
+    ):
+        self._authorize(x_quill_token)
+        if rate is not None:
+            if not 0.0 <= rate <= 1.0:
+                raise HTTPException(status_code=400, detail="rate must be between 0 and 1")
+            self.rate = rate
+        if enabled is not None:
+            self.enabled = enabled
+        return await self.status(x_quill_token)
+
+
+def _idle(stack) -> bool:
+    """Returns whether a sampled stack is of a thread waiting for work."""
+    # the loop polls in selectors, pool threads wait on their job queue
+    if stack[-1][1].endswith("selectors.py"):
+        return True
+    return any(name == "get" and file.endswith("queue.py") for name, file, _ in stack)
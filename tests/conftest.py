@@ -0,0 +1,43 @@
+import importlib.util
+import os
+import shutil
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLE_DIR = os.path.join(os.path.dirname(TESTS_DIR), "examples", "BabyQuill")
+
+
+def load_example():
+    """Imports the example project once, its classes register themselves on import."""
+    if "babyquill_example" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "babyquill_example", os.path.join(EXAMPLE_DIR, "main.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+        import tests.null_server  # noqa: F401
+    return sys.modules["babyquill_example"]
+
+
+@pytest.fixture
+def site_root(tmp_path, monkeypatch):
+    """Directory of an example project, with the minifiers faked by tests/bin."""
+    root = tmp_path / "site"
+    root.mkdir()
+    shutil.copy(os.path.join(EXAMPLE_DIR, "quill.toml"), root)
+    monkeypatch.chdir(root)
+    monkeypatch.setenv("PATH", os.path.join(TESTS_DIR, "bin") + os.pathsep + os.environ["PATH"])
+    monkeypatch.setenv("QUILL_TEST_NPX_LOG", str(tmp_path / "npx.log"))
+    return root
+
+
+@pytest.fixture
+def site(site_root):
+    """The example project, its assets are written to site_root by the test."""
+    from quill.core.config import Config
+
+    example = load_example()
+    return example.project_factory.create_project(config=Config.init())
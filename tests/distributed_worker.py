@@ -0,0 +1,50 @@
+"""Build worker run as a separate process by test_distributed."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quill.project import distributed
+
+
+class UpperProject:
+    """Builds out/<name> as the upper-cased <name> for every .txt file."""
+
+    def __init__(self, project_root: str, log: str) -> None:
+        self.project_root = project_root
+        self.log = log
+
+    def targets(self):
+        return {
+            f"out/{name}": [name]
+            for name in sorted(os.listdir(self.project_root))
+            if name.endswith(".txt")
+        }
+
+    def prepare_build(self):
+        pass
+
+    def build_fingerprint(self):
+        return "upper"
+
+    def build_targets(self, targets, dist_root):
+        for output, inputs in targets.items():
+            output_path = os.path.join(dist_root, output)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            with open(os.path.join(self.project_root, inputs[0])) as f:
+                content = f.read()
+            with open(output_path, "w") as f:
+                f.write(content.upper())
+            with open(self.log, "a") as f:
+                f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    args = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+    project = UpperProject(os.environ["QUILL_TEST_PROJECT"], os.environ["QUILL_TEST_LOG"])
+    distributed.run_worker(
+        project,
+        distributed.open_store(args["--store"]),
+        shard=int(args["--shard"]),
+        shards=int(args["--shards"]),
+    )
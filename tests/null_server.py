@@ -0,0 +1,25 @@
+"""Replaces the example's server in tests, it serves the quill UI build, which tests don't have.
+
+Loaded after the example's main.py, which registers the server type.
+"""
+import os
+
+from quill.core.types import ServerTypes
+from quill.server import BaseServer, ServerFactory
+
+
+class NullServer(BaseServer):
+    """Serves nothing, remembers what it was swapped to."""
+
+    def init(self, config):
+        self.name = config.server.name
+        self.project_dist = os.path.realpath(os.path.join(os.getcwd(), "dist"))
+
+    def run(self, port=None):
+        pass
+
+    def swap(self, path):
+        self.project_dist = path
+
+
+ServerFactory().register_server(ServerTypes.StaticWebsiteServer.value, NullServer)
@@ -0,0 +1,125 @@
+import asyncio
+import time
+
+import pytest
+
+from quill.server.admission import AdaptiveLimit, AdmissionControl, RouteClass
+
+
+def sleeping_app(delay, order=None):
+    async def app(scope, receive, send):
+        if order is not None:
+            order.append(scope["path"])
+        await asyncio.sleep(delay)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    return app
+
+
+async def request(app, path="/", method="GET"):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "path": path, "method": method, "headers": []}
+    await app(scope, receive, send)
+    return messages[0]["status"], dict(messages[0]["headers"])
+
+
+def run(*coroutines):
+    async def main():
+        tasks = []
+        for coroutine in coroutines:
+            tasks.append(asyncio.create_task(coroutine))
+            # lets each request reach the queue before the next one
+            await asyncio.sleep(0.01)
+        return await asyncio.gather(*tasks)
+
+    return asyncio.run(main())
+
+
+def test_queued_request_past_its_deadline_is_rejected():
+    route = RouteClass("api", max_concurrency=1, queue_timeout=0.05, adaptive=False, retry_after=7)
+    control = AdmissionControl(sleeping_app(0.3), routes=[route])
+
+    started = time.monotonic()
+    (first, _), (second, headers) = run(request(control, "/a"), request(control, "/b"))
+
+    assert (first, second) == (200, 503)
+    assert headers[b"retry-after"] == b"7"
+    assert time.monotonic() - started < 0.5
+
+
+def test_full_queue_rejects_right_away():
+    route = RouteClass("api", max_concurrency=1, max_queue=0, adaptive=False)
+    control = AdmissionControl(sleeping_app(0.1), routes=[route])
+
+    (first, _), (second, headers) = run(request(control, "/a"), request(control, "/b"))
+
+    assert (first, second) == (200, 503)
+    assert headers[b"retry-after"] == b"1"
+
+
+def test_queued_requests_are_admitted_by_priority():
+    order = []
+    routes = [
+        RouteClass("low", pattern="^/low", priority=2),
+        RouteClass("high", pattern="^/high", priority=0),
+    ]
+    limit = AdaptiveLimit(initial=1, max_limit=1)
+    control = AdmissionControl(sleeping_app(0.05, order), routes=routes, limit=limit)
+
+    statuses = run(
+        request(control, "/first"),
+        request(control, "/low"),
+        request(control, "/high"),
+    )
+
+    assert [status for status, _ in statuses] == [200, 200, 200]
+    assert order == ["/first", "/high", "/low"]
+
+
+def test_default_routes_separate_generation_and_key_baselines_by_route():
+    control = AdmissionControl(sleeping_app(0))
+
+    assert control.classify("/project/static/app.js").name == "static"
+    assert control.classify("/project/", "GET").name == "pages"
+    assert control.classify("/generate", "POST").name == "generation"
+    health = control.classify("/health")
+    assert control._baseline_key(health, "GET", "/items/12") == control._baseline_key(
+        health, "GET", "/items/34"
+    )
+    assert control._baseline_key(health, "GET", "/health") != control._baseline_key(
+        health, "GET", "/items/12"
+    )
+
+
+def test_interleaved_fast_and_slow_routes_keep_the_limit():
+    limit = AdaptiveLimit(initial=32)
+
+    for i in range(100):
+        limit.update("GET /health", 0.005, started=float(i))
+        limit.update("POST /generate", 1.0, started=float(i))
+
+    assert limit.limit >= 32
+
+
+def test_one_congested_round_cuts_the_limit_once():
+    limit = AdaptiveLimit(initial=32)
+    limit.update("POST /generate", 0.1, started=0.0)
+    before = limit.limit
+
+    # a round of requests all started before the first of them finished slow
+    for _ in range(32):
+        limit.update("POST /generate", 1.0, started=1.0)
+
+    assert limit.limit == pytest.approx(before * limit.backoff)
+
+    # requests started after the cut still see overload, the next round cuts again
+    limit.update("POST /generate", 1.0, started=2.5)
+    assert limit.limit == pytest.approx(before * limit.backoff**2)
@@ -0,0 +1,104 @@
+import os
+import sys
+
+import pytest
+
+from quill.project import distributed
+from quill.project.distributed import LocalArtifactStore, S3ArtifactStore
+
+from tests.distributed_worker import UpperProject
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "distributed_worker.py")
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    project_root = tmp_path / "project"
+    project_root.mkdir()
+    for i in range(8):
+        (project_root / f"page{i}.txt").write_text(f"page {i}")
+
+    log = tmp_path / "built.log"
+    # read by the worker processes
+    monkeypatch.setenv("QUILL_TEST_PROJECT", str(project_root))
+    monkeypatch.setenv("QUILL_TEST_LOG", str(log))
+    return UpperProject(str(project_root), str(log)), log
+
+
+def _built(log):
+    return log.read_text().split() if log.exists() else []
+
+
+def test_local_workers_build_every_output_once(project, tmp_path):
+    upper_project, log = project
+    store_root = str(tmp_path / "store")
+    dist_root = os.path.join(upper_project.project_root, "dist")
+
+    distributed.run_local_workers([sys.executable, WORKER, "--store", store_root], 3)
+    distributed.merge(upper_project, LocalArtifactStore(store_root))
+
+    assert sorted(_built(log)) == sorted(upper_project.targets())
+    # published like a plain build, by swapping a link to a release
+    assert os.path.islink(dist_root)
+    for i in range(8):
+        with open(os.path.join(dist_root, "out", f"page{i}.txt")) as f:
+            assert f.read() == f"PAGE {i}"
+
+
+def test_local_workers_reuse_stored_outputs(project, tmp_path):
+    upper_project, log = project
+    store_root = str(tmp_path / "store")
+    command = [sys.executable, WORKER, "--store", store_root]
+
+    distributed.run_local_workers(command, 3)
+    os.remove(log)
+    with open(os.path.join(upper_project.project_root, "page2.txt"), "w") as f:
+        f.write("changed")
+    # a different shard count moves outputs between workers, the store still hits
+    distributed.run_local_workers(command, 2)
+
+    assert _built(log) == ["out/page2.txt"]
+
+
+def test_artifact_keys_change_with_the_build_tools(project):
+    upper_project, _ = project
+    root = upper_project.project_root
+
+    key = distributed.artifact_key(root, "out/page0.txt", ["page0.txt"], "tool@1")
+
+    assert key == distributed.artifact_key(root, "out/page0.txt", ["page0.txt"], "tool@1")
+    assert key != distributed.artifact_key(root, "out/page0.txt", ["page0.txt"], "tool@2")
+
+
+@pytest.mark.parametrize("shard", [-1, 3])
+def test_worker_rejects_shard_out_of_range(project, tmp_path, shard):
+    upper_project, _ = project
+    store = LocalArtifactStore(str(tmp_path / "store"))
+
+    with pytest.raises(SystemExit):
+        distributed.run_worker(upper_project, store, shard=shard, shards=3)
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FailingClient:
+    def __init__(self, code):
+        self.code = code
+
+    def head_object(self, Bucket, Key):
+        raise ClientError(self.code)
+
+
+def test_s3_store_missing_object_is_a_miss():
+    store = S3ArtifactStore(bucket="bucket", client=FailingClient("404"))
+    assert not store.exists("key")
+
+
+def test_s3_store_other_errors_propagate():
+    store = S3ArtifactStore(bucket="bucket", client=FailingClient("403"))
+    with pytest.raises(ClientError):
+        store.exists("key")
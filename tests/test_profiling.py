@@ -0,0 +1,44 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from quill.server.profiling import ADMIN_PATH, TOKEN_HEADER, RequestProfiling
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sync_endpoints_are_profiled_in_the_threadpool(tmp_path):
+    app = FastAPI()
+
+    @app.get("/work")
+    def work():
+        spin(0.2)
+        return {}
+
+    profiling = RequestProfiling(str(tmp_path), rate=1.0, enabled=True, token="secret")
+    profiling.install(app)
+
+    with TestClient(app) as client:
+        assert client.get("/work").status_code == 200
+        status = client.get(ADMIN_PATH, headers={TOKEN_HEADER: "secret"}).json()
+
+    assert "threadpool" in status["sampled_threads"]
+    [profile] = tmp_path.glob("*-get-work.collapsed")
+    stacks = profile.read_text().splitlines()
+    assert any(stack.startswith("AnyIO worker thread;") and "spin" in stack for stack in stacks)
+    # idle pool threads are left out
+    assert not any("queue.py" in stack.split(";")[-1] for stack in stacks)
+
+
+def test_admin_endpoint_requires_the_token(tmp_path):
+    app = FastAPI()
+    RequestProfiling(str(tmp_path), token="secret").install(app)
+
+    with TestClient(app) as client:
+        assert client.get(ADMIN_PATH).status_code == 403
+        assert client.get(ADMIN_PATH, headers={TOKEN_HEADER: "wrong"}).status_code == 403
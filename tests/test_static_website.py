@@ -0,0 +1,199 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+from quill.project import distributed, releases
+from quill.project.distributed import LocalArtifactStore
+
+from tests.conftest import EXAMPLE_DIR, TESTS_DIR
+
+
+def write(root, files):
+    for path, content in files.items():
+        path = root / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def calls(site_root, tool):
+    log = site_root.parent / "npx.log"
+    lines = log.read_text().splitlines() if log.exists() else []
+    return [line for line in lines if line.split()[0].partition("@")[0] == tool]
+
+
+PAGE = """<html><head><link rel="stylesheet" href="style.css"></head><body>
+<script type="module" src="js/app.js"></script>
+<script defer src="js/legacy.js"></script>
+<script src="js/more.js"></script>
+</body></html>
+"""
+
+
+def test_module_graph_is_kept_unbundled(site, site_root, tmp_path):
+    write(
+        site_root,
+        {
+            "index.html": PAGE,
+            "js/app.js": 'import { greet } from "./lib/greet.js";\ngreet();\n',
+            "js/lib/greet.js": 'import "/js/lib/polyfill.js";\nexport function greet() {}\n',
+            "js/lib/polyfill.js": "window.ready = true;\n",
+            "js/legacy.js": "var legacy = 1;\n",
+            "js/more.js": "var more = 2;\n",
+            "style.css": '@import "base.css";\nbody { color: red; }\n',
+            "base.css": "html { margin: 0; }\n",
+        },
+    )
+    dist = tmp_path / "dist"
+    site.build(dist_root=str(dist))
+
+    page = (dist / "index.html").read_text()
+    assert '<script type="module" src="./static/js/app.js"></script>' in page
+    # classic scripts share one bundle, loaded by the first one's tag
+    assert '<script defer src="./static/index.page.js"></script>' in page
+    assert "more.js" not in page
+    assert 'href="./static/style.min.css"' in page
+
+    assert (dist / "static/index.page.js").read_text().split() == [
+        "var", "legacy", "=", "1;", "var", "more", "=", "2;"
+    ]
+    assert 'from "./lib/greet.js"' in (dist / "static/js/app.js").read_text()
+    # root relative imports point at the build too
+    assert 'import "./polyfill.js"' in (dist / "static/js/lib/greet.js").read_text()
+    assert (dist / "static/js/lib/polyfill.js").exists()
+    assert '@import "./base.min.css"' in (dist / "static/style.min.css").read_text()
+    assert (dist / "static/base.min.css").exists()
+
+    modules = [call for call in calls(site_root, "uglify-js") if "--module" in call]
+    assert len(modules) == 3
+
+
+def test_stylesheets_rebuild_when_an_import_changes(site, site_root, tmp_path):
+    write(site_root, {"style.css": '@import "base.css";\n', "base.css": "a {}\n"})
+    assert site.targets()[os.path.join("static", "style.min.css")] == ["base.css", "style.css"]
+
+    dist = tmp_path / "dist"
+    site.build(dist_root=str(dist))
+    write(site_root, {"base.css": "b {}\n"})
+    (site_root.parent / "npx.log").unlink()
+    site.build(dist_root=str(dist))
+
+    # both stylesheets are rebuilt, in one call
+    assert len(calls(site_root, "css-minify")) == 1
+    assert (dist / "static/base.min.css").read_text() == "b {}\n"
+
+
+def test_pages_and_stylesheets_are_minified_in_batches(site, site_root, tmp_path):
+    site.build_config.chunk_size = 4
+    write(site_root, {f"page{i}.html": f"<p>{i}</p>" for i in range(10)})
+    write(site_root, {f"css/style{i}.css": f"p{{order:{i}}}" for i in range(5)})
+
+    site.build(dist_root=str(tmp_path / "dist"))
+
+    assert len(calls(site_root, "html-minifier")) == 3
+    assert len(calls(site_root, "css-minify")) == 2
+    for i in range(10):
+        assert (tmp_path / "dist" / f"page{i}.html").read_text() == f"<p>{i}</p>"
+    for i in range(5):
+        built = tmp_path / "dist" / "static" / "css" / f"style{i}.min.css"
+        assert built.read_text() == f"p{{order:{i}}}"
+
+
+def test_unpublished_release_does_not_hide_changes(site, site_root):
+    write(site_root, {"index.html": "<p>one</p>"})
+    site.build()
+    write(site_root, {"index.html": "<p>two</p>"})
+    # a serve stopped mid build leaves a built release that never gets published
+    site.build(dist_root=releases.new_release(str(site_root)))
+
+    site.build()
+
+    assert (site_root / "dist" / "index.html").read_text() == "<p>two</p>"
+
+
+def test_publish_keeps_pinned_releases(site, site_root):
+    write(site_root, {"index.html": "<p>one</p>"})
+    site.build()
+    served = os.path.realpath(site_root / "dist")
+    releases.pin(str(site_root), served)
+    try:
+        for i in range(3):
+            write(site_root, {"index.html": f"<p>{i}</p>"})
+            site.build()
+        assert os.path.isfile(os.path.join(served, "index.html"))
+    finally:
+        releases.unpin(str(site_root))
+
+    site.build()
+    assert not os.path.exists(served)
+    assert len(os.listdir(site_root / ".quill" / "releases")) == 2
+
+
+def test_serve_seeds_the_release_off_the_loop(site, site_root, monkeypatch):
+    threads = []
+    new_release = releases.new_release
+
+    def recording_new_release(project_root):
+        threads.append(threading.current_thread())
+        return new_release(project_root)
+
+    monkeypatch.setattr(releases, "new_release", recording_new_release)
+    write(site_root, {"index.html": "<p>one</p>"})
+
+    release = asyncio.run(site._abuild_release())
+
+    assert threads and threading.main_thread() not in threads
+    assert os.path.isfile(os.path.join(release, "index.html"))
+
+
+SITE = {
+    "index.html": PAGE,
+    "about/index.html": '<link rel="stylesheet" href="/style.css"><script src="../js/more.js"></script>',
+    "js/app.js": 'import "./legacy.js";\n',
+    "js/legacy.js": "var legacy = 1;\n",
+    "js/more.js": "var more = 2;\n",
+    "style.css": "body {}\n",
+}
+
+
+def test_sharded_build_matches_a_plain_build(site, site_root, tmp_path):
+    write(site_root, SITE)
+    plain = tmp_path / "plain"
+    site.build(dist_root=str(plain))
+
+    store = LocalArtifactStore(str(tmp_path / "store"))
+    built = sum(distributed.run_worker(site, store, shard, 3) for shard in range(3))
+    distributed.merge(site, store)
+
+    dist = site_root / "dist"
+    assert built == len(site.targets())
+    assert os.path.islink(dist)
+    for output in site.targets():
+        assert (dist / output).read_text() == (plain / output).read_text()
+
+
+def test_cli_builds_shards_in_worker_processes(site_root, tmp_path):
+    write(site_root, SITE)
+    shutil.copy(os.path.join(EXAMPLE_DIR, "main.py"), site_root)
+    # loaded after main.py, replaces its server
+    shutil.copy(os.path.join(TESTS_DIR, "null_server.py"), site_root)
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(TESTS_DIR)}
+    command = [sys.executable, "-m", "quill.cli", "build", "main.py", "--shards", "2"]
+    command += ["--store", str(tmp_path / "store")]
+
+    subprocess.run(command, check=True, cwd=site_root, env=env)
+
+    dist = site_root / "dist"
+    assert os.path.islink(dist)
+    page = (dist / "about/index.html").read_text()
+    assert '<script src="../static/about/index.page.js"></script>' in page
+    assert 'href="../static/style.min.css"' in page
+    assert (dist / "static/about/index.page.js").read_text().strip() == "var more = 2;"
+    assert (dist / "static/js/app.js").exists()
+
+    (site_root.parent / "npx.log").unlink()
+    subprocess.run(command, check=True, cwd=site_root, env=env)
+    # everything comes from the store the second time
+    assert not (site_root.parent / "npx.log").exists()
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import pytest
+
+from quill.core import utils
+from quill.core.utils import MemoryBudget
+
+
+def test_current_rss_is_read_from_proc():
+    rss = utils.current_rss_mb()
+    if sys.platform.startswith("linux"):
+        assert rss > 0
+    else:
+        assert rss is None
+
+
+def test_chunks_shrink_over_the_ceiling_and_grow_back(monkeypatch):
+    # read once when the budget is created, then twice per resize while over
+    usage = iter([50, 150, 150, 150, 150])
+    monkeypatch.setattr(utils, "current_rss_mb", lambda: next(usage, 50))
+    budget = MemoryBudget(8, max_memory_mb=100)
+
+    sizes = [len(chunk) for chunk in budget.chunks(range(40))]
+
+    # over the ceiling even after collecting garbage, then back under it
+    assert sizes[:4] == [8, 4, 2, 4]
+    assert max(sizes) == 8
+    assert sum(sizes) == 40
+
+
+def test_chunks_keep_their_size_without_a_ceiling(monkeypatch):
+    monkeypatch.setattr(utils, "current_rss_mb", lambda: 10_000)
+    budget = MemoryBudget(8)
+
+    assert [len(chunk) for chunk in budget.chunks(range(20))] == [8, 8, 4]
+
+
+def test_run_records_the_tool_peak():
+    budget = MemoryBudget(8, max_memory_mb=100)
+
+    budget.run([sys.executable, "-c", "buffer = bytearray(200 << 20)"])
+
+    assert budget.tool_peak_mb >= 200
+    # a tool over the ceiling shrinks the next chunk
+    budget._resize()
+    assert budget.chunk_size == 4
+
+
+def test_run_raises_when_the_tool_fails():
+    with pytest.raises(subprocess.CalledProcessError):
+        MemoryBudget(8).run([sys.executable, "-c", "raise SystemExit(3)"])